@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import pandas as pd
 import numpy as np
@@ -13,92 +14,281 @@ import sys
 import math
 import base64
 import zipfile
+import string
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, Future
+import json
+import os
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo
 
-# Function to search for places
-def search_places(api_key, query, location):
-    base_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    places = []
-    next_page_token = None
+# Decoder JSON tercepat yang tersedia (orjson opsional)
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Error dari thread background (prefetch, encoding) tidak bisa ditampilkan lewat st.*
+logger = logging.getLogger(__name__)
+
+# Field yang benar-benar dipakai di main(), tanpa 'reviews' yang berat
+DETAILS_FIELDS = 'name,rating,user_ratings_total,formatted_address,formatted_phone_number,website,price_level,opening_hours'
+
+# Respons error dari Places API (status selain OK/ZERO_RESULTS); tidak boleh masuk cache
+class PlacesAPIError(Exception):
+    pass
+
+# Worker mode perbandingan: satu per lokasi (maksimal) dan satu pool bersama untuk details.
+# Pool koneksi HTTP harus cukup untuk semuanya, ditambah thread utama dan prefetch scheduler.
+COMPARE_LOCATION_WORKERS = 12
+COMPARE_DETAILS_WORKERS = 16
+HTTP_POOL_SIZE = COMPARE_LOCATION_WORKERS + COMPARE_DETAILS_WORKERS + 4
+
+# Client Places API dengan satu session keep-alive yang dipakai bersama
+class PlacesClient:
+    BASE_URL = "https://maps.googleapis.com/maps/api/place"
+
+    def __init__(self, api_key, pool_size=HTTP_POOL_SIZE):
+        self.api_key = api_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        # Google hanya mengirim respons gzip jika User-Agent mengandung "gzip"
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': 'RateSpot (gzip)'
+        })
+
+    def _get_json(self, endpoint, params):
+        params['key'] = self.api_key
+        response = self.session.get(f"{self.BASE_URL}/{endpoint}/json", params=params)
+        response.raise_for_status()
+        # response.content sudah di-decompress oleh requests
+        result = _loads(response.content)
+
+        status = result.get('status')
+        if status not in ('OK', 'ZERO_RESULTS'):
+            raise PlacesAPIError(f"{endpoint} returned {status}: {result.get('error_message', '')}")
+        return result
+
+    # Mengembalikan (places, complete); complete False jika kuota habis atau API mengembalikan error
+    def search_places(self, query, location, quota=None):
+        places = []
+        next_page_token = None
+
+        while True:
+            if quota is not None and not quota.take():
+                return places, False
+
+            params = {'query': f'{query} in {location}'}
+            if next_page_token:
+                params['pagetoken'] = next_page_token
+
+            try:
+                result = self._get_json('textsearch', params)
+            except (PlacesAPIError, requests.RequestException, ValueError) as e:
+                logger.warning("Text search failed for %s in %s: %s", query, location, e)
+                return places, False
+
+            if 'results' in result:
+                for place in result['results']:
+                    place_data = {
+                        'place_id': place.get('place_id', 'N/A'),
+                        'name': place.get('name', 'N/A'),
+                        'rating': place.get('rating', 'N/A'),
+                        'user_ratings_total': place.get('user_ratings_total', 0),
+                        'address': place.get('formatted_address', 'N/A'),
+                        'photo_reference': place.get('photos', [{}])[0].get('photo_reference')
+                    }
+                    places.append(place_data)
+                    # st.write(f"Place: {place_data['name']}, Place ID: {place_data['place_id']}, Photo Reference: {'Available' if place_data['photo_reference'] else 'Not available'}")
 
-    while True:
+            if 'next_page_token' in result:
+                next_page_token = result['next_page_token']
+                time.sleep(2)
+            else:
+                break
+
+        return places, True
+
+    def get_place_details(self, place_id, fields=DETAILS_FIELDS):
         params = {
-            'query': f'{query} in {location}',
-            'key': api_key
+            'place_id': place_id,
+            'fields': fields
         }
-        if next_page_token:
-            params['pagetoken'] = next_page_token
-
-        response = requests.get(base_url, params=params)
-        result = response.json()
-
-        if 'results' in result:
-            for place in result['results']:
-                place_data = {
-                    'place_id': place.get('place_id', 'N/A'),
-                    'name': place.get('name', 'N/A'),
-                    'rating': place.get('rating', 'N/A'),
-                    'user_ratings_total': place.get('user_ratings_total', 0),
-                    'address': place.get('formatted_address', 'N/A'),
-                    'photo_reference': place.get('photos', [{}])[0].get('photo_reference')
-                }
-                places.append(place_data)
-                # st.write(f"Place: {place_data['name']}, Place ID: {place_data['place_id']}, Photo Reference: {'Available' if place_data['photo_reference'] else 'Not available'}")
-
-        if 'next_page_token' in result:
-            next_page_token = result['next_page_token']
-            time.sleep(2)
-        else:
-            break
+        try:
+            result = self._get_json('details', params)
+        except (PlacesAPIError, requests.RequestException, ValueError) as e:
+            # None tidak disimpan di cache, jadi request berikutnya mencoba lagi
+            logger.warning("Place details failed for %s: %s", place_id, e)
+            return None
 
-    return places
+        return result.get('result', {})
 
-    
-def get_place_details(api_key, place_id):
-    base_url = "https://maps.googleapis.com/maps/api/place/details/json"
-    params = {
-        'place_id': place_id,
-        'fields': 'name,rating,user_ratings_total,formatted_address,formatted_phone_number,website,price_level,opening_hours,reviews',
-        'key': api_key
-    }
+    def get_place_photo(self, photo_reference, max_width=1600):  # Meningkatkan max_width
+        if not photo_reference:
+            return None
 
-    response = requests.get(base_url, params=params)
-    result = response.json()
+        params = {
+            'maxwidth': max_width,
+            'photoreference': photo_reference,
+            'key': self.api_key
+        }
 
-    return result.get('result', {})
+        try:
+            response = self.session.get(f"{self.BASE_URL}/photo", params=params)
+            response.raise_for_status()
 
-def get_place_photo(api_key, photo_reference, max_width=1600):  # Meningkatkan max_width
+            if response.headers.get('content-type', '').startswith('image'):
+                # Menggunakan PIL untuk membuka dan mengoptimalkan gambar
+                image = Image.open(BytesIO(response.content))
+
+                # Mengoptimalkan gambar
+                optimized_image = BytesIO()
+                image.save(optimized_image, format='JPEG', quality=95, optimize=True)
+                optimized_image.seek(0)
+
+                return optimized_image.getvalue()
+            else:
+                st.warning(f"Received non-image response for photo reference: {photo_reference[:10]}...")
+                return None
+
+        except requests.RequestException as e:
+            st.error(f"Error fetching photo: {str(e)}")
+            return None
+
+# Satu client per API key, bertahan antar rerun Streamlit
+@st.cache_resource
+def get_places_client(api_key):
+    return PlacesClient(api_key)
+
+# Prefetch berjalan sekali per hari, jadi hasilnya harus tetap valid sampai run berikutnya
+PREFETCH_PERIOD = 24 * 60 * 60
+CACHE_TTL = PREFETCH_PERIOD + 60 * 60
+# Kapasitas untuk traffic pengguna; scheduler menambah kapasitas untuk entri prefetch-nya
+CACHE_MAX_ENTRIES = 2000
+# 1 search + ~60 details + 10 foto + 12 poster per pasangan query/lokasi, dibulatkan ke atas
+PREFETCH_ENTRIES_PER_PAIR = 100
+
+# Cache di memori (LRU + TTL) untuk hasil API dan poster, diisi juga oleh prefetch scheduler
+class WarmCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.base_entries = max_entries
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, entry, now):
+        return now - entry[0] >= self.ttl
+
+    # Tambah kapasitas di atas base_entries supaya hasil prefetch tidak langsung
+    # tergusur oleh search pengguna di siang hari
+    def reserve(self, entries):
+        with self._lock:
+            self.max_entries = max(self.max_entries, self.base_entries + entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            now = time.time()
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_entries:
+                for stale_key in [k for k, entry in self._data.items() if self._expired(entry, now)]:
+                    del self._data[stale_key]
+            # Buang entri yang paling lama tidak dipakai
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def fetch(self, key, loader, refresh=False):
+        if not refresh:
+            value = self.get(key)
+            if value is not None:
+                return value
+        value = loader()
+        # Hasil gagal (None) tidak disimpan supaya dicoba lagi
+        if value is not None:
+            self.set(key, value)
+        return value
+
+@st.cache_resource
+def get_warm_cache():
+    return WarmCache()
+
+# Kuota request Places API yang dipakai bersama oleh beberapa worker;
+# hanya terpakai jika data belum ada di cache
+class QuotaBudget:
+    def __init__(self, max_requests):
+        self.max_requests = max_requests
+        self.remaining = max_requests
+        self.denied = False  # True jika ada request yang ditolak karena kuota habis
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.remaining <= 0:
+                self.denied = True
+                return False
+            self.remaining -= 1
+            return True
+
+    @property
+    def exhausted(self):
+        return self.remaining <= 0
+
+    @property
+    def used(self):
+        return self.max_requests - self.remaining
+
+# Function to search for places
+def search_places(api_key, query, location, refresh=False, quota=None):
+    cache = get_warm_cache()
+    key = ('search', query, location)
+    if not refresh:
+        places = cache.get(key)
+        if places is not None:
+            return places
+
+    places, complete = get_places_client(api_key).search_places(query, location, quota)
+    # Hasil yang terpotong karena kuota tidak disimpan
+    if complete:
+        cache.set(key, places)
+    return places
+
+def get_place_details(api_key, place_id, fields=DETAILS_FIELDS, refresh=False, quota=None):
+    def load():
+        if quota is not None and not quota.take():
+            return None
+        return get_places_client(api_key).get_place_details(place_id, fields)
+
+    return get_warm_cache().fetch(('details', place_id, fields), load, refresh)
+
+def get_place_photo(api_key, photo_reference, max_width=1600, refresh=False, quota=None):
     if not photo_reference:
         return None
-    
-    base_url = "https://maps.googleapis.com/maps/api/place/photo"
-    params = {
-        'maxwidth': max_width,
-        'photoreference': photo_reference,
-        'key': api_key
-    }
-    
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        
-        if response.headers.get('content-type', '').startswith('image'):
-            # Menggunakan PIL untuk membuka dan mengoptimalkan gambar
-            image = Image.open(BytesIO(response.content))
-            
-            # Mengoptimalkan gambar
-            optimized_image = BytesIO()
-            image.save(optimized_image, format='JPEG', quality=95, optimize=True)
-            optimized_image.seek(0)
-            
-            return optimized_image.getvalue()
-        else:
-            st.warning(f"Received non-image response for photo reference: {photo_reference[:10]}...")
+
+    def load():
+        if quota is not None and not quota.take():
             return None
-    
-    except requests.RequestException as e:
-        st.error(f"Error fetching photo: {str(e)}")
-        return None
-        
+        return get_places_client(api_key).get_place_photo(photo_reference, max_width)
+
+    return get_warm_cache().fetch(('photo', photo_reference, max_width), load, refresh)
+
 # Function to get place details
 # def get_place_details(api_key, place_id):
 #     base_url = "https://maps.googleapis.com/maps/api/place/details/json"
@@ -117,6 +307,8 @@ def min_max_scale(series):
     return (series - series.min()) / (series.max() - series.min())
 
 # Fungsi-fungsi untuk pembuatan poster
+# Fragmen SVG bintang hanya dibuat sekali per nilai persentase/rating
+@lru_cache(maxsize=None)
 def create_star_svg(percentage):
     return f'''
     <svg width="24" height="24" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
@@ -131,24 +323,49 @@ def create_star_svg(percentage):
     </svg>
     '''
 
-def create_coffee_shops_poster(df, query, location, width=900, bg_color="#C1A87D"):
-    shops_html = ""
-    for index, row in df.iterrows():
-        stars_html = ''.join([create_star_svg(max(0, min(100, (row['rating'] - i) * 100))) for i in range(5)])
-        shops_html += f'''
+@lru_cache(maxsize=None)
+def create_stars_html(rating):
+    return ''.join([create_star_svg(max(0, min(100, (rating - i) * 100))) for i in range(5)])
+
+# Ambil baris sebagai tuple dari array kolom (lebih cepat dari df.iterrows())
+def iter_rows(df, *columns):
+    return zip(*(df[column].tolist() for column in columns))
+
+# Template HTML dikompilasi sekali saat modul dimuat menjadi fungsi f-string, sehingga
+# render tidak perlu mem-parse ulang template seperti str.format
+def compile_template(template):
+    fields = sorted({field for _, field, _, _ in string.Formatter().parse(template) if field})
+    source = f"lambda *, {', '.join(fields)}: f'''{template}'''"
+    return eval(compile(source, '<poster template>', 'eval'), {})
+
+# Registry desain poster beserta metadata render-nya. Semua fungsi render memakai
+# signature yang sama: (df, query, location, width, photo_bytes=None)
+POSTER_TEMPLATES = {}
+
+def register_poster(design, fixed_height=False, needs_photo=False):
+    def decorator(render):
+        POSTER_TEMPLATES[design] = {
+            'render': render,
+            'fixed_height': fixed_height,
+            'needs_photo': needs_photo
+        }
+        return render
+    return decorator
+
+_COFFEE_ROW = compile_template('''
         <div class="bg-gray-100 p-4 rounded-lg shadow-md mb-4">
             <div class="flex justify-between items-center">
-                <span class="font-semibold text-lg text-gray-800">{row['rank']}. {row['name']}</span>
+                <span class="font-semibold text-lg text-gray-800">{rank}. {name}</span>
                 <div class="flex items-center">
                     <div class="flex mr-2">{stars_html}</div>
-                    <span class="font-medium text-lg text-gray-800">{row['rating']:.1f}</span>
+                    <span class="font-medium text-lg text-gray-800">{rating:.1f}</span>
                 </div>
             </div>
-            <div class="text-sm text-gray-600 mt-1">{row['user_ratings_total']:,} ratings</div>
+            <div class="text-sm text-gray-600 mt-1">{user_ratings_total:,} ratings</div>
         </div>
-        '''
+        ''')
 
-    return f'''
+_COFFEE_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -161,7 +378,7 @@ def create_coffee_shops_poster(df, query, location, width=900, bg_color="#C1A87D
         </style>
     </head>
     <body>
-        <div class="poster-container bg-white" style="width: {width}px; height: {int(width * 1.4)}px;">
+        <div class="poster-container bg-white" style="width: {width}px; height: {height}px;">
             <div class="flex flex-col items-center justify-center h-full">
                 <div class="w-5/6 max-w-2xl">
                     <h1 class="text-3xl font-bold mb-6 text-gray-900 text-center">Top 10 {query} di {location}</h1>
@@ -174,27 +391,32 @@ def create_coffee_shops_poster(df, query, location, width=900, bg_color="#C1A87D
         </div>
     </body>
     </html>
-    '''
+    ''')
 
-def create_modern_bar_chart_poster(df, query, location, width=900):
-    shops_html = ""
-    max_rating = df['rating'].max()
-    for index, row in df.iterrows():
-        bar_width = f"{(row['rating'] / max_rating) * 100}%"
-        shops_html += f'''
+@register_poster('original', fixed_height=True)
+def create_coffee_shops_poster(df, query, location, width=900, photo_bytes=None):
+    shops_html = ''.join([
+        _COFFEE_ROW(rank=rank, name=name, rating=rating, user_ratings_total=user_ratings_total,
+                    stars_html=create_stars_html(rating))
+        for rank, name, rating, user_ratings_total in iter_rows(df, 'rank', 'name', 'rating', 'user_ratings_total')
+    ])
+    return _COFFEE_PAGE(shops_html=shops_html, query=query, location=location,
+                        width=width, height=int(width * 1.4))
+
+_MODERN_ROW = compile_template('''
         <div class="mb-4">
             <div class="flex justify-between items-center mb-1">
-                <span class="font-medium text-sm text-gray-800">{row['rank']}. {row['name']}</span>
-                <span class="text-sm text-gray-600">{row['rating']}</span>
+                <span class="font-medium text-sm text-gray-800">{rank}. {name}</span>
+                <span class="text-sm text-gray-600">{rating}</span>
             </div>
             <div class="w-full bg-gray-200 rounded-full h-2.5">
                 <div class="bg-blue-600 h-2.5 rounded-full" style="width: {bar_width}"></div>
             </div>
-            <div class="text-xs text-gray-500 mt-1">{row['user_ratings_total']:,} ratings</div>
+            <div class="text-xs text-gray-500 mt-1">{user_ratings_total:,} ratings</div>
         </div>
-        '''
+        ''')
 
-    return f'''
+_MODERN_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -218,24 +440,31 @@ def create_modern_bar_chart_poster(df, query, location, width=900):
         </div>
     </body>
     </html>
-    '''
+    ''')
 
-def create_colorful_card_poster(df, query, location, width=900):
-    color_accents = ['red', 'blue', 'green', 'yellow', 'purple', 'pink', 'indigo', 'teal', 'orange', 'cyan']
-    shops_html = ""
-    for index, row in df.iterrows():
-        accent = color_accents[index % len(color_accents)]
-        shops_html += f'''
+@register_poster('modern')
+def create_modern_bar_chart_poster(df, query, location, width=900, photo_bytes=None):
+    max_rating = df['rating'].max()
+    shops_html = ''.join([
+        _MODERN_ROW(rank=rank, name=name, rating=rating, user_ratings_total=user_ratings_total,
+                    bar_width=f"{(rating / max_rating) * 100}%")
+        for rank, name, rating, user_ratings_total in iter_rows(df, 'rank', 'name', 'rating', 'user_ratings_total')
+    ])
+    return _MODERN_PAGE(shops_html=shops_html, query=query, location=location, width=width)
+
+_COLOR_ACCENTS = ['red', 'blue', 'green', 'yellow', 'purple', 'pink', 'indigo', 'teal', 'orange', 'cyan']
+
+_COLORFUL_ROW = compile_template('''
         <div class="bg-white rounded-lg shadow-md p-4 border-l-4 border-{accent}-500">
             <div class="flex justify-between items-center">
-                <span class="font-semibold text-lg text-gray-800">{row['rank']}. {row['name']}</span>
-                <span class="font-bold text-{accent}-600">{row['rating']}</span>
+                <span class="font-semibold text-lg text-gray-800">{rank}. {name}</span>
+                <span class="font-bold text-{accent}-600">{rating}</span>
             </div>
-            <div class="text-sm text-gray-600 mt-1">{row['user_ratings_total']:,} ratings</div>
+            <div class="text-sm text-gray-600 mt-1">{user_ratings_total:,} ratings</div>
         </div>
-        '''
+        ''')
 
-    return f'''
+_COLORFUL_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -259,13 +488,19 @@ def create_colorful_card_poster(df, query, location, width=900):
         </div>
     </body>
     </html>
-    '''
+    ''')
 
-def create_minimalist_circle_poster(df, query, location, width=900):
-    shops_html = ""
-    for index, row in df.iterrows():
-        circle_percentage = (row['rating'] / 5) * 100
-        shops_html += f'''
+@register_poster('colorful')
+def create_colorful_card_poster(df, query, location, width=900, photo_bytes=None):
+    shops_html = ''.join([
+        _COLORFUL_ROW(rank=rank, name=name, rating=rating, user_ratings_total=user_ratings_total,
+                      accent=_COLOR_ACCENTS[index % len(_COLOR_ACCENTS)])
+        for index, (rank, name, rating, user_ratings_total)
+        in zip(df.index.tolist(), iter_rows(df, 'rank', 'name', 'rating', 'user_ratings_total'))
+    ])
+    return _COLORFUL_PAGE(shops_html=shops_html, query=query, location=location, width=width)
+
+_CIRCLE_ROW = compile_template('''
         <div class="flex items-center mb-4">
             <div class="relative w-16 h-16 mr-4">
                 <svg class="w-full h-full" viewBox="0 0 36 36">
@@ -278,17 +513,17 @@ def create_minimalist_circle_poster(df, query, location, width=900):
                         a 15.9155 15.9155 0 0 1 0 -31.831"
                         fill="none" stroke="#4CAF50" stroke-width="3"
                         stroke-dasharray="{circle_percentage}, 100" />
-                    <text x="18" y="20.35" class="text-xl font-semibold" text-anchor="middle" fill="#333">{row['rating']}</text>
+                    <text x="18" y="20.35" class="text-xl font-semibold" text-anchor="middle" fill="#333">{rating}</text>
                 </svg>
             </div>
             <div>
-                <div class="font-medium text-gray-900">{row['rank']}. {row['name']}</div>
-                <div class="text-sm text-gray-600">{row['user_ratings_total']:,} ratings</div>
+                <div class="font-medium text-gray-900">{rank}. {name}</div>
+                <div class="text-sm text-gray-600">{user_ratings_total:,} ratings</div>
             </div>
         </div>
-        '''
+        ''')
 
-    return f'''
+_CIRCLE_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -312,30 +547,36 @@ def create_minimalist_circle_poster(df, query, location, width=900):
         </div>
     </body>
     </html>
-    '''
+    ''')
+
+@register_poster('minimalist')
+def create_minimalist_circle_poster(df, query, location, width=900, photo_bytes=None):
+    shops_html = ''.join([
+        _CIRCLE_ROW(rank=rank, name=name, rating=rating, user_ratings_total=user_ratings_total,
+                    circle_percentage=(rating / 5) * 100)
+        for rank, name, rating, user_ratings_total in iter_rows(df, 'rank', 'name', 'rating', 'user_ratings_total')
+    ])
+    return _CIRCLE_PAGE(shops_html=shops_html, query=query, location=location, width=width)
 
-def create_infographic_icon_poster(df, query, location, width=900):
-    shops_html = ""
-    for index, row in df.iterrows():
-        shops_html += f'''
+_INFOGRAPHIC_ROW = compile_template('''
         <div class="flex items-center mb-6">
             <div class="w-12 h-12 flex-shrink-0 mr-4 bg-yellow-400 rounded-full flex items-center justify-center">
-                <span class="text-2xl font-bold text-white">{row['rank']}</span>
+                <span class="text-2xl font-bold text-white">{rank}</span>
             </div>
             <div class="flex-grow">
-                <div class="font-medium text-lg text-gray-900">{row['name']}</div>
+                <div class="font-medium text-lg text-gray-900">{name}</div>
                 <div class="flex items-center mt-1">
                     <svg class="w-5 h-5 text-yellow-500 mr-1" fill="currentColor" viewBox="0 0 20 20">
                         <path d="M9.049 2.927c.3-.921 1.603-.921 1.902 0l1.07 3.292a1 1 0 00.95.69h3.462c.969 0 1.371 1.24.588 1.81l-2.8 2.034a1 1 0 00-.364 1.118l1.07 3.292c.3.921-.755 1.688-1.54 1.118l-2.8-2.034a1 1 0 00-1.175 0l-2.8 2.034c-.784.57-1.838-.197-1.539-1.118l1.07-3.292a1 1 0 00-.364-1.118L2.98 8.72c-.783-.57-.38-1.81.588-1.81h3.461a1 1 0 00.951-.69l1.07-3.292z"></path>
                     </svg>
-                    <span class="text-sm font-semibold text-gray-700">{row['rating']}</span>
-                    <span class="text-sm text-gray-500 ml-2">({row['user_ratings_total']:,} ratings)</span>
+                    <span class="text-sm font-semibold text-gray-700">{rating}</span>
+                    <span class="text-sm text-gray-500 ml-2">({user_ratings_total:,} ratings)</span>
                 </div>
             </div>
         </div>
-        '''
+        ''')
 
-    return f'''
+_INFOGRAPHIC_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -359,17 +600,17 @@ def create_infographic_icon_poster(df, query, location, width=900):
         </div>
     </body>
     </html>
-    '''
+    ''')
 
-def create_minimalist_text_poster(query, location, width=900, photo_bytes=None):
-    height = int(width * 1.4)  # Mempertahankan rasio portrait
-
-    if photo_bytes:
-        bg_image = f'data:image/jpeg;base64,{base64.b64encode(photo_bytes).decode()}'
-    else:
-        bg_image = ''  # Fallback jika tidak ada foto
+@register_poster('infographic')
+def create_infographic_icon_poster(df, query, location, width=900, photo_bytes=None):
+    shops_html = ''.join([
+        _INFOGRAPHIC_ROW(rank=rank, name=name, rating=rating, user_ratings_total=user_ratings_total)
+        for rank, name, rating, user_ratings_total in iter_rows(df, 'rank', 'name', 'rating', 'user_ratings_total')
+    ])
+    return _INFOGRAPHIC_PAGE(shops_html=shops_html, query=query, location=location, width=width)
 
-    return f'''
+_MINIMALIST_TEXT_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -398,24 +639,33 @@ def create_minimalist_text_poster(query, location, width=900, photo_bytes=None):
         </div>
     </body>
     </html>
-    '''
+    ''')
+
+@register_poster('minimalist_text', fixed_height=True, needs_photo=True)
+def create_minimalist_text_poster(df, query, location, width=900, photo_bytes=None):
+    height = int(width * 1.4)  # Mempertahankan rasio portrait
+
+    if photo_bytes:
+        bg_image = f'data:image/jpeg;base64,{base64.b64encode(photo_bytes).decode()}'
+    else:
+        bg_image = ''  # Fallback jika tidak ada foto
 
+    return _MINIMALIST_TEXT_PAGE(query=query, location=location, width=width, height=height,
+                                 bg_image=bg_image)
 
-def create_retro_grid_poster(df, query, location, width=900):
-    shops_html = ""
-    for index, row in df.iterrows():
-        shops_html += f'''
+
+_RETRO_ROW = compile_template('''
         <div class="bg-yellow-100 p-4 rounded-lg border-2 border-yellow-600">
-            <div class="font-bold text-2xl text-yellow-800 mb-2">{row['rank']}</div>
-            <div class="font-medium text-yellow-900 mb-1">{row['name']}</div>
+            <div class="font-bold text-2xl text-yellow-800 mb-2">{rank}</div>
+            <div class="font-medium text-yellow-900 mb-1">{name}</div>
             <div class="flex items-center justify-between">
-                <span class="text-sm font-bold text-yellow-700">{row['rating']} ★</span>
-                <span class="text-xs text-yellow-800">{row['user_ratings_total']:,} ratings</span>
+                <span class="text-sm font-bold text-yellow-700">{rating} ★</span>
+                <span class="text-xs text-yellow-800">{user_ratings_total:,} ratings</span>
             </div>
         </div>
-        '''
+        ''')
 
-    return f'''
+_RETRO_PAGE = compile_template('''
     <!DOCTYPE html>
     <html>
     <head>
@@ -440,8 +690,69 @@ def create_retro_grid_poster(df, query, location, width=900):
         </div>
     </body>
     </html>
-    '''
+    ''')
+
+@register_poster('retro')
+def create_retro_grid_poster(df, query, location, width=900, photo_bytes=None):
+    shops_html = ''.join([
+        _RETRO_ROW(rank=rank, name=name, rating=rating, user_ratings_total=user_ratings_total)
+        for rank, name, rating, user_ratings_total in iter_rows(df, 'rank', 'name', 'rating', 'user_ratings_total')
+    ])
+    return _RETRO_PAGE(shops_html=shops_html, query=query, location=location, width=width)
 
+_LEADERBOARD_ROW = compile_template('''
+        <div class="flex items-center bg-white rounded-lg shadow-sm p-4">
+            <div class="w-12 flex-shrink-0 text-2xl font-bold text-indigo-600">{rank}</div>
+            <div class="flex-grow">
+                <div class="font-semibold text-lg text-gray-900">{name}</div>
+                <div class="text-sm text-indigo-500">{district}</div>
+            </div>
+            <div class="text-right">
+                <div class="flex items-center justify-end">
+                    <div class="flex mr-2">{stars_html}</div>
+                    <span class="font-medium text-lg text-gray-800">{rating:.1f}</span>
+                </div>
+                <div class="text-xs text-gray-500 mt-1">{user_ratings_total:,} ratings</div>
+            </div>
+        </div>
+        ''')
+
+_LEADERBOARD_PAGE = compile_template('''
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <script src="https://cdn.tailwindcss.com"></script>
+        <style>
+            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
+            body {{ font-family: 'Inter', sans-serif; }}
+        </style>
+    </head>
+    <body>
+        <div class="poster-container">
+            <div class="bg-indigo-50 p-8" style="width: {width}px;">
+                <h1 class="text-3xl font-bold mb-6 text-gray-900 text-center">{query} terbaik di {location}</h1>
+                <div class="space-y-3">
+                    {shops_html}
+                </div>
+                <div class="mt-6 text-xs text-gray-500 text-center">Data based on user ratings and reviews</div>
+            </div>
+        </div>
+    </body>
+    </html>
+    ''')
+
+# Poster gabungan: satu tempat terbaik per lokasi, kolom 'location' berisi nama lokasi
+@register_poster('leaderboard')
+def create_leaderboard_poster(df, query, location, width=900, photo_bytes=None):
+    shops_html = ''.join([
+        _LEADERBOARD_ROW(rank=rank, name=name, district=district, rating=rating,
+                         user_ratings_total=user_ratings_total, stars_html=create_stars_html(rating))
+        for rank, name, district, rating, user_ratings_total
+        in iter_rows(df, 'rank', 'name', 'location', 'rating', 'user_ratings_total')
+    ])
+    return _LEADERBOARD_PAGE(shops_html=shops_html, query=query, location=location, width=width)
 
 # Fungsi untuk menginstal Chromium
 def install_chromium():
@@ -485,22 +796,10 @@ def install_chromium():
 
 # Modifikasi fungsi generate_poster untuk menerima photo_bytes
 def generate_poster(df, query, location, design, width=900, photo_bytes=None):
-    if design == 'minimalist_text':
-        html_content = create_minimalist_text_poster(query, location, width, photo_bytes)
-    elif design == 'original':
-        html_content = create_coffee_shops_poster(df, query, location, width)
-    elif design == 'modern':
-        html_content = create_modern_bar_chart_poster(df, query, location, width)
-    elif design == 'colorful':
-        html_content = create_colorful_card_poster(df, query, location, width)
-    elif design == 'minimalist':
-        html_content = create_minimalist_circle_poster(df, query, location, width)
-    elif design == 'infographic':
-        html_content = create_infographic_icon_poster(df, query, location, width)
-    elif design == 'retro':
-        html_content = create_retro_grid_poster(df, query, location, width)
-    else:
+    template = POSTER_TEMPLATES.get(design)
+    if template is None:
         raise ValueError("Invalid design choice")
+    html_content = template['render'](df, query, location, width, photo_bytes)
 
     try:
         with sync_playwright() as p:
@@ -508,7 +807,7 @@ def generate_poster(df, query, location, design, width=900, photo_bytes=None):
             page = browser.new_page()
             page.set_content(html_content)
             
-            if design in ['original', 'minimalist_text']:
+            if template['fixed_height']:
                 # Use fixed height for these designs
                 page.set_viewport_size({"width": width, "height": int(width * 1.4)})
             else:
@@ -528,7 +827,7 @@ def generate_poster(df, query, location, design, width=900, photo_bytes=None):
 
 def create_individual_place_poster(place, photo_bytes, width=1200):
     height = int(width * 1.4)
-    stars_html = ''.join([create_star_svg(max(0, min(100, (place['rating'] - i) * 100))) for i in range(5)])
+    stars_html = create_stars_html(place['rating'])
     
     if photo_bytes:
         photo_html = f'''
@@ -583,13 +882,400 @@ def generate_individual_poster(place, photo_bytes, width=1200):
             page = browser.new_page()
             page.set_content(html_content)
             page.set_viewport_size({"width": width, "height": int(width * 1.4)})
-            screenshot_bytes = page.locator('.poster-container').screenshot(type='jpeg', quality=100)
+            # Screenshot lossless, kompresi dilakukan di tahap encoding
+            screenshot_bytes = page.locator('.poster-container').screenshot()
             browser.close()
         return screenshot_bytes
     except Exception as e:
         st.error(f"Error generating individual poster: {str(e)}")
         return None
 
+# Tahap encoding setelah render: PNG palet untuk desain flat, JPEG/WebP untuk desain berfoto.
+# Screenshot Playwright tidak punya metadata dan Pillow tidak menyalin metadata saat save,
+# jadi tidak perlu opsi strip metadata.
+PHOTO_QUALITY = 85
+
+def encode_poster(poster_bytes, photo=False, photo_format='JPEG'):
+    image = Image.open(BytesIO(poster_bytes))
+    output = BytesIO()
+    if photo:
+        image = image.convert('RGB')
+        if photo_format == 'WEBP':
+            image.save(output, format='WEBP', quality=PHOTO_QUALITY, method=4)
+            extension = 'webp'
+        else:
+            image.save(output, format='JPEG', quality=PHOTO_QUALITY, optimize=True, progressive=True)
+            extension = 'jpg'
+    else:
+        image = image.convert('RGB').quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        image.save(output, format='PNG', optimize=True)
+        extension = 'png'
+
+    encoded_bytes = output.getvalue()
+    # Screenshot asli (PNG) dipakai jika hasil encoding justru lebih besar
+    if len(encoded_bytes) >= len(poster_bytes):
+        return poster_bytes, 'png'
+    return encoded_bytes, extension
+
+# Worker pool untuk encoding, berjalan paralel dengan render poster berikutnya
+@st.cache_resource
+def get_encoder_pool(max_workers=4):
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+# Hasil: (bytes, ekstensi, ukuran PNG mentah). Jika encoding gagal, PNG asli dipakai.
+def encode_poster_safe(poster_bytes, photo=False, photo_format='JPEG'):
+    try:
+        encoded_bytes, extension = encode_poster(poster_bytes, photo, photo_format)
+    except Exception:
+        logger.exception("Poster encoding failed, keeping the original PNG")
+        encoded_bytes, extension = poster_bytes, 'png'
+    return encoded_bytes, extension, len(poster_bytes)
+
+def submit_encode(poster_bytes, photo=False, photo_format='JPEG'):
+    return get_encoder_pool().submit(encode_poster_safe, poster_bytes, photo, photo_format)
+
+# Ringkasan ukuran dan estimasi waktu unduh (bandwidth dalam Mbps)
+def encoding_report(original_size, encoded_size, original_zip_size, zip_size, bandwidth_mbps=10):
+    bytes_per_second = bandwidth_mbps * 1_000_000 / 8
+    return {
+        'original_size': original_size,
+        'encoded_size': encoded_size,
+        'bytes_saved': original_size - encoded_size,
+        'percent_saved': (1 - encoded_size / original_size) * 100 if original_size else 0,
+        'original_zip_size': original_zip_size,
+        'zip_size': zip_size,
+        'download_seconds': zip_size / bytes_per_second,
+        'original_download_seconds': original_zip_size / bytes_per_second
+    }
+
+# Desain poster yang dibuat di main()
+POSTER_DESIGNS = ['minimalist_text', 'original']
+
+PLACE_COLUMNS = ['name', 'rating', 'user_ratings_total', 'address', 'phone', 'website', 'price_level',
+                 'open_now', 'latitude', 'longitude', 'photo_reference', 'place_id']
+
+# Ambil data semua tempat lalu pilih top 10
+# Jika executor diberikan, request details dijalankan paralel di pool tersebut
+def fetch_top_places(api_key, query, location, refresh=False, on_progress=None, quota=None, executor=None):
+    places = search_places(api_key, query, location, refresh=refresh, quota=quota)
+
+    def load_details(place):
+        place_id = place.get('place_id')
+        if place_id == 'N/A':
+            return {}
+        # Jika kuota habis, pakai data dari hasil search saja
+        return get_place_details(api_key, place_id, refresh=refresh, quota=quota) or {}
+
+    all_details = executor.map(load_details, places) if executor else map(load_details, places)
+
+    data = []
+    for i, (place, details) in enumerate(zip(places, all_details), 1):
+        if on_progress:
+            on_progress(i / len(places))
+        place_id = place.get('place_id')
+
+        place_data = {
+            'name': details.get('name', place.get('name', 'N/A')),
+            'rating': details.get('rating', place.get('rating', np.nan)),
+            'user_ratings_total': details.get('user_ratings_total', place.get('user_ratings_total', 0)),
+            'address': details.get('formatted_address', place.get('address', 'N/A')),
+            'phone': details.get('formatted_phone_number', 'N/A'),
+            'website': details.get('website', 'N/A'),
+            'price_level': details.get('price_level', 'N/A'),
+            'open_now': details.get('opening_hours', {}).get('open_now', 'N/A'),
+            'latitude': place.get('geometry', {}).get('location', {}).get('lat', 'N/A'),
+            'longitude': place.get('geometry', {}).get('location', {}).get('lng', 'N/A'),
+            'photo_reference': place.get('photo_reference'),  # Pastikan ini ada
+            'place_id': place_id
+        }
+
+        data.append(place_data)
+
+    # Kolom eksplisit supaya hasil kosong (tidak ada tempat / error API) tetap bisa difilter
+    df = pd.DataFrame(data, columns=PLACE_COLUMNS)
+    df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+    df['user_ratings_total'] = pd.to_numeric(df['user_ratings_total'], errors='coerce')
+
+    # Sorting and filtering
+    df = df[df['rating'] > 4.2]
+    df = df[df['user_ratings_total'] > 100]
+    # df = df.sort_values(by=['rating', 'user_ratings_total'], ascending=[False, False]).reset_index(drop=True)
+    df = df.sort_values(by='user_ratings_total', ascending=False).reset_index(drop=True)
+
+    return places, df, select_top10(df)
+
+# 10 tempat dengan ulasan terbanyak, lalu diberi peringkat berdasarkan rating
+def select_top10(df):
+    df_top10 = df.sort_values(by='user_ratings_total', ascending=False, kind='stable').head(10)
+    df_top10 = df_top10.sort_values(by=['rating', 'user_ratings_total'], ascending=[False, False]).reset_index(drop=True)
+    df_top10['rank'] = df_top10.index + 1
+    return df_top10
+
+# Render lalu encode di worker pool; yang disimpan di cache adalah hasil encoding, bukan PNG mentah.
+# Mengembalikan Future berisi (bytes, ekstensi, ukuran PNG mentah), atau None jika render gagal.
+def _encoded_poster(key, render, photo, photo_format, refresh):
+    cache = get_warm_cache()
+    key = key + (photo_format if photo else None,)
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+    poster_bytes = render()
+    if poster_bytes is None:
+        return None
+    future = submit_encode(poster_bytes, photo, photo_format)
+    future.add_done_callback(lambda done: cache.set(key, done.result()))
+    return future
+
+# Versi cache dari generate_poster / generate_individual_poster
+def get_poster(df, query, location, design, photo_bytes=None, refresh=False, photo_format='JPEG'):
+    return _encoded_poster(
+        ('poster', design, query, location),
+        lambda: generate_poster(df, query, location, design, photo_bytes=photo_bytes),
+        POSTER_TEMPLATES[design]['needs_photo'], photo_format, refresh)
+
+def get_individual_poster(place, photo_bytes, query, location, refresh=False, photo_format='JPEG'):
+    return _encoded_poster(
+        ('individual', query, location, place['rank'], place['name']),
+        lambda: generate_individual_poster(place, photo_bytes),
+        True, photo_format, refresh)
+
+# Tampilkan poster yang encoding-nya sudah selesai ke placeholder masing-masing
+def show_finished_posters(posters, wait=False):
+    for poster in posters:
+        if poster['shown'] or not (wait or poster['future'].done()):
+            continue
+        file_bytes, _, _ = poster['future'].result()
+        poster['placeholder'].image(file_bytes, caption=poster['caption'], use_column_width=True)
+        poster['shown'] = True
+
+# Refresh semua cache (search, details, foto, poster) untuk satu pasangan query/lokasi.
+# Setiap request API diambil dari quota; poster tidak dirender ulang dari data yang
+# terpotong karena kuota habis.
+def warm_query(api_key, query, location, quota=None):
+    _, _, df_top10 = fetch_top_places(api_key, query, location, refresh=True, quota=quota)
+    if df_top10.empty or (quota is not None and quota.denied):
+        return False
+
+    first_place_photo = get_place_photo(api_key, df_top10.iloc[0]['photo_reference'], refresh=True, quota=quota)
+    photos = [first_place_photo]
+    for photo_reference in df_top10['photo_reference'].tolist()[1:]:
+        photos.append(get_place_photo(api_key, photo_reference, refresh=True, quota=quota))
+    if quota is not None and quota.denied:
+        return False
+
+    for design in POSTER_DESIGNS:
+        photo_bytes = first_place_photo if POSTER_TEMPLATES[design]['needs_photo'] else None
+        get_poster(df_top10, query, location, design, photo_bytes=photo_bytes, refresh=True)
+
+    for (_, place), photo_bytes in zip(df_top10.iterrows(), photos):
+        get_individual_poster(place, photo_bytes, query, location, refresh=True)
+    return True
+
+# Daftar popularitas query/lokasi dari run sebelumnya
+POPULARITY_FILE = 'popular_queries.json'
+_popularity_lock = threading.Lock()
+
+def load_popularity():
+    if not os.path.exists(POPULARITY_FILE):
+        return {}
+    try:
+        with open(POPULARITY_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record_query(query, location):
+    key = f'{query}|{location}'
+    with _popularity_lock:
+        counts = load_popularity()
+        counts[key] = counts.get(key, 0) + 1
+        with open(POPULARITY_FILE, 'w') as f:
+            json.dump(counts, f)
+
+# Pasangan query/lokasi terpopuler: konfigurasi di secrets dulu, lalu dari riwayat
+def popular_queries(configured=(), top_n=30):
+    pairs = [tuple(pair) for pair in configured]
+    ranked = sorted(load_popularity().items(), key=lambda item: item[1], reverse=True)
+    for key, _ in ranked:
+        pair = tuple(key.split('|', 1))
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs[:top_n]
+
+# Jam sepi dihitung di zona waktu lokasi pengguna, bukan zona waktu server
+PREFETCH_TIMEZONE = 'Asia/Jakarta'
+
+# Scheduler yang memanaskan cache di jam sepi, dibatasi kuota per jendela
+class PrefetchScheduler:
+    def __init__(self, api_key, configured=(), off_peak_hours=(1, 6), budget=1000,
+                 top_n=30, interval=15 * 60, timezone=PREFETCH_TIMEZONE):
+        self.api_key = api_key
+        self.configured = configured
+        self.off_peak_hours = off_peak_hours
+        self.timezone = ZoneInfo(timezone)
+        self.budget = budget
+        self.top_n = top_n
+        self.interval = interval
+        self.warmed_window = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def in_off_peak(self, now):
+        start, end = self.off_peak_hours
+        if start <= end:
+            return start <= now.hour < end
+        return now.hour >= start or now.hour < end
+
+    # Kuota dihitung dari request scheduler sendiri, bukan dari traffic pengguna
+    def run_once(self):
+        quota = QuotaBudget(self.budget)
+        for query, location in popular_queries(self.configured, self.top_n):
+            if quota.exhausted:
+                break
+            try:
+                warm_query(self.api_key, query, location, quota=quota)
+            except Exception:
+                logger.exception("Prefetch failed for %s in %s", query, location)
+        return quota.used
+
+    def _run(self):
+        while True:
+            now = datetime.now(self.timezone)
+            # Cukup sekali per jendela jam sepi per hari (lihat PREFETCH_PERIOD)
+            if self.in_off_peak(now) and self.warmed_window != now.date():
+                self.warmed_window = now.date()
+                self.run_once()
+            time.sleep(self.interval)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+# Satu scheduler per proses server, dikonfigurasi lewat [prefetch] di secrets
+@st.cache_resource
+def start_prefetch_scheduler(api_key, configured=(), off_peak_hours=(1, 6), budget=1000, top_n=30,
+                             timezone=PREFETCH_TIMEZONE):
+    get_warm_cache().reserve(top_n * PREFETCH_ENTRIES_PER_PAIR)
+    return PrefetchScheduler(api_key, configured, off_peak_hours, budget, top_n, timezone=timezone).start()
+
+# Mode perbandingan: search/details untuk banyak lokasi dijalankan paralel,
+# semua request (halaman search dan details) memakai satu kuota bersama
+COMPARE_REQUEST_BUDGET = 1000
+
+# Mengembalikan (combined, lokasi tanpa hasil, lokasi yang gagal, quota)
+def compare_locations(api_key, query, locations, request_budget=COMPARE_REQUEST_BUDGET):
+    quota = QuotaBudget(request_budget)
+    location_workers = max(1, min(len(locations), COMPARE_LOCATION_WORKERS))
+    with ThreadPoolExecutor(max_workers=COMPARE_DETAILS_WORKERS) as details_executor, \
+            ThreadPoolExecutor(max_workers=location_workers) as executor:
+        futures = {
+            location: executor.submit(fetch_top_places, api_key, query, location,
+                                      quota=quota, executor=details_executor)
+            for location in locations
+        }
+
+        frames = []
+        no_results = []
+        failed = []
+        for location, future in futures.items():
+            try:
+                _, df, _ = future.result()
+            except Exception:
+                logger.exception("Comparison failed for %s in %s", query, location)
+                failed.append(location)
+                continue
+            if df.empty:
+                no_results.append(location)
+                continue
+            # Posisi kandidat di lokasi ini (urutan yang dipakai untuk memilih top 10)
+            df = df.copy()
+            df.insert(0, 'location', location)
+            df['candidate_rank'] = df.index + 1
+            frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(), no_results, failed, quota
+
+    # Lokasi yang berdekatan sering mengembalikan tempat yang sama; deduplikasi sebelum
+    # top 10 dipilih, dan simpan tiap tempat hanya di lokasi dengan posisi terbaiknya
+    candidates = pd.concat(frames, ignore_index=True)
+    candidates = candidates.sort_values(by=['candidate_rank', 'rating', 'user_ratings_total'],
+                                        ascending=[True, False, False])
+    duplicated = candidates.duplicated(subset='place_id') & (candidates['place_id'] != 'N/A')
+    candidates = candidates[~duplicated].drop(columns='candidate_rank')
+
+    # 'rank' adalah peringkat per lokasi, 'overall_rank' peringkat gabungan
+    combined = pd.concat(
+        [select_top10(group) for _, group in candidates.groupby('location', sort=False)],
+        ignore_index=True)
+    combined = combined.sort_values(by=['rating', 'user_ratings_total'], ascending=[False, False]).reset_index(drop=True)
+    combined['overall_rank'] = combined.index + 1
+    return combined, no_results, failed, quota
+
+# Tempat peringkat 1 dari setiap lokasi, diurutkan untuk poster leaderboard
+def location_leaders(combined):
+    leaders = combined[combined['rank'] == 1].reset_index(drop=True)
+    leaders['rank'] = leaders.index + 1
+    return leaders
+
+def run_comparison(api_key, query, locations):
+    with st.spinner(f"Comparing {query} across {len(locations)} locations..."):
+        combined, no_results, failed, quota = compare_locations(api_key, query, locations)
+
+    if no_results:
+        st.warning(f"No results for: {', '.join(no_results)}")
+    if failed:
+        st.error(f"Comparison failed for: {', '.join(failed)}. See the server log for details.")
+    if quota.denied:
+        st.warning(f"Request budget of {quota.max_requests} Places API calls was used up; "
+                   "some places use search data only and some searches may be incomplete.")
+    if combined.empty:
+        st.error("No places found for any location.")
+        return
+
+    st.header("Comparison Results:")
+    combined_renamed = combined.rename(columns={
+                            'location': 'Lokasi',
+                            'rank': 'Peringkat Lokasi',
+                            'overall_rank': 'Peringkat Keseluruhan',
+                            'name': 'Nama Tempat',
+                            'rating': 'Rating',
+                            'user_ratings_total': 'Jumlah Ulasan',
+                            'address': 'Alamat',
+                            'price_level': 'Tingkat Harga'
+                        })
+    st.dataframe(combined_renamed,
+                 height=400,
+                 use_container_width=True)
+
+    install_chromium()
+    leaders = location_leaders(combined)
+    with st.spinner("Generating leaderboard poster..."):
+        poster_bytes = generate_poster(leaders, query, f"{len(leaders)} lokasi", 'leaderboard')
+
+    if poster_bytes:
+        file_bytes, extension, _ = submit_encode(poster_bytes).result()
+        st.image(file_bytes, caption="Leaderboard Poster", use_column_width=True)
+        st.download_button(
+            label="Download Leaderboard Poster",
+            data=file_bytes,
+            file_name=f"leaderboard_{query.lower().replace(' ', '_')}.{extension}",
+            mime=f"image/{extension}"
+        )
+    else:
+        st.error("Failed to generate leaderboard poster.")
+
+    csv = combined.to_csv(index=False)
+    st.download_button(
+        label="Download comparison data as CSV",
+        data=csv,
+        file_name=f'{query.lower().replace(" ", "_")}_comparison.csv',
+        mime='text/csv',
+    )
+
 # Main Streamlit app
 def main():
     st.title("Google Places Ratespot - by Orion")
@@ -597,55 +1283,51 @@ def main():
     # Get API key from Streamlit secrets
     api_key = st.secrets["google_places_api_key"]
 
+    mode = st.radio("Mode", ["Single location", "Compare locations"], horizontal=True)
+
     # User inputs
-    location = st.text_input("Enter location", "Tangerang Selatan")
+    if mode == "Compare locations":
+        locations_text = st.text_area("Locations to compare (one per line)", "Ciputat\nPamulang\nSerpong\nBintaro")
+    else:
+        location = st.text_input("Enter location", "Tangerang Selatan")
     query = st.text_input("Enter place type", "Coffee Shop")
+    # Leaderboard di mode perbandingan selalu PNG, jadi format foto hanya untuk mode satu lokasi
+    if mode != "Compare locations":
+        photo_format = st.selectbox("Photo poster format", ["JPEG", "WEBP"])
 
-    if st.button("Search"):
-        places = search_places(api_key, query, location)
+    # Prefetch di jam sepi untuk pasangan query/lokasi populer
+    prefetch_config = st.secrets.get("prefetch", {})
+    if prefetch_config.get("enabled", True):
+        start_prefetch_scheduler(
+            api_key,
+            configured=tuple(tuple(pair) for pair in prefetch_config.get("queries", [])),
+            off_peak_hours=tuple(prefetch_config.get("off_peak_hours", (1, 6))),
+            budget=prefetch_config.get("budget", 1000),
+            top_n=prefetch_config.get("top_n", 30),
+            timezone=prefetch_config.get("timezone", PREFETCH_TIMEZONE)
+        )
 
-        st.write(f"\nTotal places found: {len(places)}")
+    if mode == "Compare locations":
+        if st.button("Compare"):
+            locations = [line.strip() for line in locations_text.splitlines() if line.strip()]
+            for location in locations:
+                record_query(query, location)
+            run_comparison(api_key, query, locations)
+        return
+
+    if st.button("Search"):
+        record_query(query, location)
 
-        data = []
         progress_bar = st.progress(0)
-        for i, place in enumerate(places, 1):
-            progress_bar.progress(i / len(places))
-            place_id = place.get('place_id')
-            if place_id != 'N/A':
-                details = get_place_details(api_key, place_id)
-            else:
-                details = {}
-
-            place_data = {
-                'name': details.get('name', place.get('name', 'N/A')),
-                'rating': details.get('rating', place.get('rating', np.nan)),
-                'user_ratings_total': details.get('user_ratings_total', place.get('user_ratings_total', 0)),
-                'address': details.get('formatted_address', place.get('address', 'N/A')),
-                'phone': details.get('formatted_phone_number', 'N/A'),
-                'website': details.get('website', 'N/A'),
-                'price_level': details.get('price_level', 'N/A'),
-                'open_now': details.get('opening_hours', {}).get('open_now', 'N/A'),
-                'latitude': place.get('geometry', {}).get('location', {}).get('lat', 'N/A'),
-                'longitude': place.get('geometry', {}).get('location', {}).get('lng', 'N/A'),
-                'photo_reference': place.get('photo_reference')  # Pastikan ini ada
-            }
-
-            data.append(place_data)
-
-        df = pd.DataFrame(data)
-        df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
-        df['user_ratings_total'] = pd.to_numeric(df['user_ratings_total'], errors='coerce')
-
-        # Sorting and filtering
-        df = df[df['rating'] > 4.2]
-        df = df[df['user_ratings_total'] > 100]
-        # df = df.sort_values(by=['rating', 'user_ratings_total'], ascending=[False, False]).reset_index(drop=True)
-        df = df.sort_values(by='user_ratings_total', ascending=False).reset_index(drop=True)
-
-        df_top10 = df.head(10)
-        df_top10 = df_top10.sort_values(by=['rating', 'user_ratings_total'], ascending=[False, False]).reset_index(drop=True)
-        df_top10['rank'] = df_top10.index + 1
-        
+        places, df, df_top10 = fetch_top_places(api_key, query, location, on_progress=progress_bar.progress)
+        # place_id hanya dipakai untuk deduplikasi di mode perbandingan
+        df = df.drop(columns='place_id')
+        df_top10 = df_top10.drop(columns='place_id')
+
+        st.write(f"\nTotal places found: {len(places)}")
+        if df_top10.empty:
+            st.error(f"No places found for {query} in {location}. Please try again later.")
+            return
 
         # st.header("Top 10 Places:")
         # st.write("Checking df_top10 for photo references:")
@@ -695,17 +1377,12 @@ def main():
         # except Exception as e:
         #     st.error(f"An error occurred: {str(e)}")
 
-        # Ambil foto dari tempat pertama untuk poster minimalis
-        first_place_photo = None
-        if df_top10.iloc[0]['photo_reference']:
-            first_place_photo = get_place_photo(api_key, df_top10.iloc[0]['photo_reference'], max_width=1600)
-
         # Membuat list untuk menyimpan semua poster
         all_posters = []
         
         st.header("Generated Posters")
         
-        designs = ['minimalist_text', 'original']
+        designs = POSTER_DESIGNS
         
         # Ambil foto dari tempat pertama untuk poster minimalis
         first_place_photo = None
@@ -714,15 +1391,20 @@ def main():
         
         for design in designs:
             with st.spinner(f"Generating {design} poster..."):
-                if design == 'minimalist_text':
-                    poster_bytes = generate_poster(df_top10, query, location, design, photo_bytes=first_place_photo)
+                if POSTER_TEMPLATES[design]['needs_photo']:
+                    poster = get_poster(df_top10, query, location, design, photo_bytes=first_place_photo, photo_format=photo_format)
                 else:
-                    poster_bytes = generate_poster(df_top10, query, location, design)
+                    poster = get_poster(df_top10, query, location, design, photo_format=photo_format)
                 
-                if poster_bytes:
-                    image = Image.open(io.BytesIO(poster_bytes))
-                    st.image(image, caption=f"{design.capitalize()} Poster", use_column_width=True)
-                    all_posters.append((f"{design}_poster.png", poster_bytes))
+                if poster:
+                    all_posters.append({
+                        'file_stem': f"{design}_poster",
+                        'caption': f"{design.capitalize()} Poster",
+                        'placeholder': st.empty(),
+                        'future': poster,
+                        'shown': False
+                    })
+                    show_finished_posters(all_posters)
                 else:
                     st.error(f"Failed to generate {design} poster.")
 
@@ -737,19 +1419,48 @@ def main():
                 st.warning(f"No photo reference available for {place['name']}")
             
             with st.spinner(f"Generating poster for {place['name']}..."):
-                individual_poster_bytes = generate_individual_poster(place, photo_bytes)
-                if individual_poster_bytes:
-                    image = Image.open(io.BytesIO(individual_poster_bytes))
-                    st.image(image, caption=f"{place['name']} Poster", use_column_width=True)
-                    all_posters.append((f"{place['rank']:02d}_{place['name'].lower().replace(' ', '_')}_poster.png", individual_poster_bytes))
+                individual_poster = get_individual_poster(place, photo_bytes, query, location, photo_format=photo_format)
+                if individual_poster:
+                    all_posters.append({
+                        'file_stem': f"{place['rank']:02d}_{place['name'].lower().replace(' ', '_')}_poster",
+                        'caption': f"{place['name']} Poster",
+                        'placeholder': st.empty(),
+                        'future': individual_poster,
+                        'shown': False
+                    })
+                    show_finished_posters(all_posters)
                 else:
                     st.error(f"Failed to generate poster for {place['name']}")
 
-        # Membuat file zip yang berisi semua poster
+        with st.spinner("Optimizing posters..."):
+            show_finished_posters(all_posters, wait=True)
+
+        # Membuat file zip yang berisi semua poster hasil encoding.
+        # ZIP_STORED (tanpa kompresi) sehingga ukuran ZIP dari PNG mentah bisa dihitung persis:
+        # selisihnya hanya ukuran data dan panjang ekstensi nama file (local header + central directory).
+        original_size = 0
+        encoded_size = 0
+        original_zip_extra = 0
         zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w") as zip_file:
-            for file_name, file_bytes in all_posters:
-                zip_file.writestr(file_name, file_bytes)
+        with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_STORED) as zip_file:
+            for poster in all_posters:
+                file_bytes, extension, raw_size = poster['future'].result()
+                original_size += raw_size
+                encoded_size += len(file_bytes)
+                original_zip_extra += (raw_size - len(file_bytes)) + 2 * (len('png') - len(extension))
+                zip_file.writestr(f"{poster['file_stem']}.{extension}", file_bytes)
+
+        zip_size = len(zip_buffer.getvalue())
+        report = encoding_report(original_size, encoded_size, zip_size + original_zip_extra, zip_size)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Poster size", f"{report['encoded_size'] / 1024:,.0f} KB",
+                    f"-{report['bytes_saved'] / 1024:,.0f} KB ({report['percent_saved']:.0f}%)", delta_color="inverse")
+        col2.metric("ZIP size", f"{report['zip_size'] / 1024:,.0f} KB",
+                    f"{(report['zip_size'] - report['original_zip_size']) / 1024:,.0f} KB vs raw PNG ZIP", delta_color="inverse")
+        col3.metric("Download @10 Mbps", f"{report['download_seconds']:.1f} s",
+                    f"{report['download_seconds'] - report['original_download_seconds']:.1f} s vs raw PNG ZIP", delta_color="inverse")
+        st.caption(f"Poster memory (cached, encoded): {report['encoded_size'] / 1024:,.0f} KB "
+                   f"instead of {report['original_size'] / 1024:,.0f} KB raw PNG")
         
         # Tombol download untuk semua poster
         st.download_button(